@@ -0,0 +1,179 @@
+"""Admission control for expensive endpoints (AI parsing, PDF rendering).
+
+A pure ASGI middleware, so requests are rejected before their body is read:
+- per-client token buckets (429 + Retry-After)
+- a global concurrency cap per endpoint class (503 + Retry-After),
+  counting requests only once their body has been received
+- a request body size cutoff, checked against Content-Length and while
+  the body streams in (413)
+"""
+
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+MAX_TRACKED_CLIENTS = 10_000
+
+
+class EndpointClass:
+    """Limits shared by a group of endpoints, e.g. everything that calls OpenAI."""
+
+    def __init__(self, name: str, rate_per_min: float, burst: int, max_concurrent: int):
+        self.name = name
+        self.rate = rate_per_min / 60.0  # tokens per second
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()  # client → (tokens, updated)
+
+    @classmethod
+    def from_env(cls, name: str, rate_per_min: float, burst: int, max_concurrent: int) -> "EndpointClass":
+        """Defaults overridable via e.g. AI_RATE_PER_MIN, AI_BURST, AI_MAX_CONCURRENT."""
+        prefix = name.upper()
+        return cls(
+            name,
+            float(os.getenv(f"{prefix}_RATE_PER_MIN", rate_per_min)),
+            int(os.getenv(f"{prefix}_BURST", burst)),
+            int(os.getenv(f"{prefix}_MAX_CONCURRENT", max_concurrent)),
+        )
+
+    def take(self, client: str) -> float:
+        """Spend one token for client. Returns 0 if allowed, else seconds to wait."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self._buckets[client] = (tokens - 1, now)
+            wait = 0.0
+        else:
+            self._buckets[client] = (tokens, now)
+            wait = (1 - tokens) / self.rate
+        while len(self._buckets) > MAX_TRACKED_CLIENTS:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def refund(self, client: str) -> None:
+        """Give back a token spent on a request that was then turned away."""
+        if client in self._buckets:
+            tokens, updated = self._buckets[client]
+            self._buckets[client] = (min(self.burst, tokens + 1), updated)
+
+
+def _format_size(size: int) -> str:
+    """256 * 1024 → '256KB', 10 MB + 64 KB → '10.1MB'."""
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f}".removesuffix(".0") + "MB"
+    return f"{size / 1024:.0f}KB"
+
+
+class BodyTooLarge(HTTPException):
+    def __init__(self, limit: int):
+        super().__init__(413, f"Zapytanie jest za duże. Maksymalny rozmiar to {_format_size(limit)}.")
+
+
+class Overloaded(HTTPException):
+    def __init__(self):
+        super().__init__(503, "Serwer jest teraz zajęty. Spróbuj ponownie za chwilę.",
+                         headers={"Retry-After": "1"})
+
+
+class AdmissionMiddleware:
+    """
+    routes maps a POST path to (EndpointClass, max body bytes).
+    Other paths and methods pass through untouched.
+    """
+
+    def __init__(self, app, routes: dict[str, tuple[EndpointClass, int]], trust_proxy: bool = False):
+        self.app = app
+        self.routes = routes
+        self.trust_proxy = trust_proxy
+
+    def _client(self, scope) -> str:
+        headers = dict(scope.get("headers") or [])
+        forwarded = headers.get(b"x-forwarded-for", b"").decode("latin-1")
+        if self.trust_proxy and forwarded:
+            # The last hop was appended by our own proxy; earlier ones are client-supplied
+            return forwarded.split(",")[-1].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        rule = self.routes.get(scope.get("path")) if scope["type"] == "http" else None
+        if rule is None or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        endpoint, body_limit = rule
+
+        headers = dict(scope.get("headers") or [])
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > body_limit:
+            await _reject(send, BodyTooLarge(body_limit))
+            return
+
+        # Already full — turn away before spending the client's token
+        if endpoint.in_flight >= endpoint.max_concurrent:
+            await _reject(send, Overloaded(), retry_after=1)
+            return
+
+        client = self._client(scope)
+        wait = endpoint.take(client)
+        if wait > 0:
+            await _reject(send, HTTPException(429, "Zbyt wiele zapytań. Spróbuj ponownie za chwilę."),
+                          retry_after=wait)
+            return
+
+        received = 0
+        admitted = False
+
+        async def limited_receive():
+            nonlocal received, admitted
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > body_limit:
+                    raise BodyTooLarge(body_limit)
+                if not message.get("more_body", False) and not admitted:
+                    # Body complete: the expensive part starts now, so take a slot
+                    # (slow uploaders don't hold one while they trickle data in)
+                    if endpoint.in_flight >= endpoint.max_concurrent:
+                        endpoint.refund(client)
+                        raise Overloaded()
+                    endpoint.in_flight += 1
+                    admitted = True
+            return message
+
+        started = False
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except (BodyTooLarge, Overloaded) as e:
+            # FastAPI normally turns these into responses itself; this covers
+            # anything that reads the body outside its request handling
+            if started:
+                raise
+            await _reject(send, e, retry_after=1 if isinstance(e, Overloaded) else None)
+        finally:
+            if admitted:
+                endpoint.in_flight -= 1
+
+
+async def _reject(send, exc: HTTPException, retry_after: float | None = None) -> None:
+    body = json.dumps({"detail": exc.detail}).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(max(1, math.ceil(retry_after))).encode()))
+    await send({"type": "http.response.start", "status": exc.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,321 @@
+"""Shared cache tier for MenuAI (rendered pages, slug lookups, parse results)."""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from dotenv import load_dotenv
+
+from menu_compact import CompactMenu, dumps, loads, pack, unpack
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# memory = per-process only, sqlite = shared by all workers on one host, none = disabled
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(tempfile.gettempdir(), "menuai-cache.sqlite3"))
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+
+
+# ─── Value encoding ──────────────────────────────────────────
+
+def _encode(value: Any) -> bytes:
+    """Tag values so bytes (PDF), str (HTML), menus and dicts (lookups) round-trip."""
+    if isinstance(value, bytes):
+        return b"b" + value
+    if isinstance(value, str):
+        return b"s" + value.encode("utf-8")
+    if isinstance(value, CompactMenu):
+        return b"m" + pack(value)
+    return b"j" + dumps(value)
+
+
+def _decode(blob: bytes) -> Any:
+    tag, body = blob[:1], bytes(blob[1:])
+    if tag == b"b":
+        return body
+    if tag == b"s":
+        return body.decode("utf-8")
+    if tag == b"m":
+        return unpack(body)
+    return loads(body)
+
+
+# ─── Backends ────────────────────────────────────────────────
+
+class CacheBackend:
+    """
+    Cache interface. Values are str, bytes, CompactMenu or JSON-serializable objects.
+    Versions are integer counters per namespace, used to build versioned keys
+    so that bumping a namespace invalidates every key derived from it.
+    """
+
+    def get(self, key: str) -> Any | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: int | None = None) -> bool:
+        """Set key only if absent (or expired). Returns True if it was stored."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def get_version(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    def bump_version(self, namespace: str) -> int | None:
+        """Increment and return the version, or None if the bump failed."""
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    """Caching disabled — every lookup is a miss."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def add(self, key, value, ttl=None):
+        return True
+
+    def delete(self, key):
+        pass
+
+    def get_version(self, namespace):
+        return 0
+
+    def bump_version(self, namespace):
+        return 0
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache. Not shared between uvicorn workers."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            expires_at, value = hit
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl or CACHE_TTL)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] >= now:
+                return False
+            self._entries[key] = (now + (ttl or CACHE_TTL), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_version(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def bump_version(self, namespace):
+        with self._lock:
+            version = self._versions.get(namespace, 0) + 1
+            self._versions[namespace] = version
+            return version
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache stored in a local SQLite file (WAL mode), shared by every worker
+    process on the host. Version bumps are visible to all workers at once.
+    """
+
+    PURGE_EVERY = 200  # purge expired rows every N writes
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions ("
+                " namespace TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread — sqlite3 connections are not thread-safe."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("cache get failed: %s", e)
+            return None
+        if row is None or row[1] < time.time():
+            return None
+        try:
+            return _decode(row[0])
+        except ValueError as e:
+            # Written by another code version (e.g. an older packed menu format)
+            logger.warning("cache entry %s unreadable: %s", key, e)
+            return None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl or CACHE_TTL)
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, _encode(value), expires_at),
+                )
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    self._purge(conn)
+        except sqlite3.Error as e:
+            logger.warning("cache set failed: %s", e)
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        try:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM entries WHERE key = ? AND expires_at < ?", (key, now))
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, _encode(value), now + (ttl or CACHE_TTL)),
+                )
+        except sqlite3.Error as e:
+            # Fail open: callers use add() for dedupe of idempotent work
+            logger.warning("cache add failed: %s", e)
+            return True
+        return cur.rowcount == 1
+
+    def _purge(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM entries WHERE key NOT IN"
+            " (SELECT key FROM entries ORDER BY expires_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def delete(self, key):
+        try:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning("cache delete failed: %s", e)
+
+    def get_version(self, namespace):
+        try:
+            row = self._conn().execute(
+                "SELECT version FROM versions WHERE namespace = ?", (namespace,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("cache version read failed: %s", e)
+            return 0
+        return row[0] if row else 0
+
+    def bump_version(self, namespace):
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT INTO versions (namespace, version) VALUES (?, 1)"
+                    " ON CONFLICT(namespace) DO UPDATE SET version = version + 1",
+                    (namespace,),
+                )
+                row = conn.execute(
+                    "SELECT version FROM versions WHERE namespace = ?", (namespace,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("cache version bump failed: %s", e)
+            return None
+        return row[0]
+
+
+# ─── Cache instance (lazy init) ──────────────────────────────
+
+_cache: CacheBackend | None = None
+
+
+def get_cache() -> CacheBackend:
+    """Return the configured cache backend. Falls back to memory if SQLite is unusable."""
+    global _cache
+    if _cache is None:
+        if CACHE_BACKEND == "none":
+            _cache = NullCache()
+        elif CACHE_BACKEND == "memory":
+            _cache = MemoryCache()
+        else:
+            try:
+                _cache = SQLiteCache()
+            except sqlite3.Error as e:
+                logger.warning("SQLite cache unavailable (%s), using in-memory cache", e)
+                _cache = MemoryCache()
+    return _cache
+
+
+# ─── Key helpers ─────────────────────────────────────────────
+
+def menu_key(slug: str, kind: str) -> str:
+    """Versioned key for a published menu artifact ('row', 'html', ...)."""
+    version = get_cache().get_version(f"menu:{slug}")
+    return f"menu:{slug}:v{version}:{kind}"
+
+
+def invalidate_menu(slug: str) -> bool:
+    """Drop every cached artifact of a published menu, in all workers. False if that failed."""
+    return get_cache().bump_version(f"menu:{slug}") is not None
+
+
+def content_key(kind: str, *parts: str | bytes) -> str:
+    """Content-addressed key, e.g. content_key('pdf', template, menu_json)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else part.encode("utf-8"))
+        h.update(b"\x00")
+    return f"{kind}:{h.hexdigest()}"
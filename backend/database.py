@@ -5,10 +5,15 @@ import json
 import re
 import string
 import random
+import hashlib
+import hmac
+import secrets
 from datetime import datetime, timezone
 
 from dotenv import load_dotenv
 
+from cache import get_cache, menu_key, invalidate_menu
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
@@ -50,19 +55,43 @@ def make_slug(name: str) -> str:
     return f"{clean}-{suffix}"
 
 
+# ─── Edit tokens ─────────────────────────────────────────────
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def check_edit_token(entry: dict, token: str) -> bool:
+    """True if token matches the one issued when the menu was published."""
+    expected = entry.get("edit_token_hash")
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(expected, _hash_token(token))
+
+
 # ─── In-memory fallback (dev without Supabase) ───────────────
 
 _memory_store: dict[str, dict] = {}
+_memory_payments: list[dict] = []
 
 
 # ─── Menu CRUD ───────────────────────────────────────────────
 
+def _invalidate(slugs: list[str]) -> None:
+    """Bump cache versions; raise so the caller's retry gets another attempt."""
+    failed = [slug for slug in slugs if not invalidate_menu(slug)]
+    if failed:
+        raise RuntimeError(f"Cache invalidation failed for: {', '.join(failed)}")
+
+
 def save_menu(menu_data: dict, template: str) -> dict:
     """
-    Save a published menu. Returns {"slug": ..., "id": ...}.
+    Save a published menu. Returns {"slug": ..., "id": ..., "edit_token": ...}.
+    Only a hash of the edit token is stored; the caller must keep the token.
     Uses Supabase if configured, otherwise in-memory.
     """
     slug = make_slug(menu_data.get("business_name", "menu"))
+    edit_token = secrets.token_urlsafe(24)
     sb = get_supabase()
 
     if sb is not None:
@@ -73,11 +102,13 @@ def save_menu(menu_data: dict, template: str) -> dict:
             "template": template,
             "menu_data": menu_data,
             "is_paid": False,
+            "edit_token_hash": _hash_token(edit_token),
         }
         result = sb.table("menus").insert(row).execute()
         record = result.data[0]
-        return {"slug": record["slug"], "id": record["id"]}
+        return {"slug": record["slug"], "id": record["id"], "edit_token": edit_token}
     else:
+        now = datetime.now(timezone.utc).isoformat()
         _memory_store[slug] = {
             "slug": slug,
             "business_name": menu_data.get("business_name", ""),
@@ -85,16 +116,25 @@ def save_menu(menu_data: dict, template: str) -> dict:
             "template": template,
             "menu_data": menu_data,
             "is_paid": False,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "edit_token_hash": _hash_token(edit_token),
+            "created_at": now,
+            "updated_at": now,
         }
-        return {"slug": slug, "id": slug}
+        return {"slug": slug, "id": slug, "edit_token": edit_token}
 
 
-def get_menu_by_slug(slug: str) -> dict | None:
+def get_menu_by_slug(slug: str, fresh: bool = False) -> dict | None:
     """
     Fetch a published menu by slug.
     Returns {"menu_data": ..., "template": ..., "is_paid": ..., ...} or None.
+    Found rows are cached under a versioned key (see _invalidate);
+    fresh=True skips the cached copy, e.g. before a conditional update.
     """
+    key = menu_key(slug, "row")
+    cached = None if fresh else get_cache().get(key)
+    if cached is not None:
+        return cached
+
     sb = get_supabase()
 
     if sb is not None:
@@ -105,33 +145,135 @@ def get_menu_by_slug(slug: str) -> dict | None:
             .limit(1)
             .execute()
         )
-        if result.data:
-            return result.data[0]
-        return None
+        entry = result.data[0] if result.data else None
     else:
-        return _memory_store.get(slug)
+        entry = _memory_store.get(slug)
 
+    if entry is not None:
+        get_cache().set(key, entry)
+    return entry
 
-def mark_menu_paid(slug: str) -> bool:
+
+def update_menu(slug: str, menu_data: dict, expected_updated_at: str | None) -> dict | None:
     """
-    Set is_paid=True for a menu by slug.
-    Returns True if found and updated, False otherwise.
+    Replace menu_data of a published menu in place (slug stays the same).
+    Only applies if the row's updated_at still equals expected_updated_at,
+    so concurrent edits cannot overwrite each other. Returns the updated
+    row, or None if the slug does not exist or was changed in the meantime.
+    Invalidates the cached row and rendered page in every worker.
     """
+    fields = {
+        "business_name": menu_data.get("business_name", ""),
+        "business_type": menu_data.get("business_type", ""),
+        "menu_data": menu_data,
+    }
     sb = get_supabase()
 
     if sb is not None:
+        # updated_at is bumped by the trg_menus_updated_at trigger
         result = (
             sb.table("menus")
-            .update({"is_paid": True})
+            .update(fields)
             .eq("slug", slug)
+            .eq("updated_at", expected_updated_at)
             .execute()
         )
-        return len(result.data) > 0
+        entry = result.data[0] if result.data else None
     else:
-        if slug in _memory_store:
-            _memory_store[slug]["is_paid"] = True
-            return True
-        return False
+        entry = _memory_store.get(slug)
+        if entry is not None and entry.get("updated_at") != expected_updated_at:
+            entry = None
+        if entry is not None:
+            entry.update(fields, updated_at=datetime.now(timezone.utc).isoformat())
+
+    # No write-through: a payment landing after this write would bump the
+    # version again, and the row cached here would then be served as current
+    if entry is not None:
+        _invalidate([slug])
+    return entry
+
+
+def mark_menus_paid(slugs: list[str]) -> list[str]:
+    """
+    Set is_paid=True for several menus in a single write.
+    Only menus that were still unpaid are written, so replaying the same
+    slugs is cheap. Every given slug is invalidated regardless — if a
+    previous attempt wrote the row but failed to invalidate, the retry
+    still clears the stale unpaid page. Returns the slugs that changed.
+    """
+    if not slugs:
+        return []
+    sb = get_supabase()
+
+    if sb is not None:
+        result = (
+            sb.table("menus")
+            .update({"is_paid": True})
+            .in_("slug", slugs)
+            .eq("is_paid", False)
+            .execute()
+        )
+        changed = [row["slug"] for row in result.data]
+    else:
+        changed = []
+        for slug in slugs:
+            entry = _memory_store.get(slug)
+            if entry is not None and not entry.get("is_paid"):
+                entry["is_paid"] = True
+                changed.append(slug)
+
+    _invalidate(slugs)
+    return changed
+
+
+def record_payments(payments: list[dict]) -> int:
+    """
+    Insert completed payments in a single write.
+    Each payment: {"menu_slug", "amount", "provider_id"}. Rows whose
+    provider_id is already recorded are skipped. Returns rows written.
+    """
+    if not payments:
+        return 0
+    sb = get_supabase()
+
+    if sb is not None:
+        slugs = list({p["menu_slug"] for p in payments})
+        result = sb.table("menus").select("id, slug").in_("slug", slugs).execute()
+        ids = {row["slug"]: row["id"] for row in result.data}
+        rows = [
+            {
+                "menu_id": ids[p["menu_slug"]],
+                "amount": p["amount"],
+                "status": "completed",
+                "provider_id": p["provider_id"],
+            }
+            for p in payments
+            if p["menu_slug"] in ids
+        ]
+        if not rows:
+            return 0
+        result = (
+            sb.table("payments")
+            .upsert(rows, on_conflict="provider_id", ignore_duplicates=True)
+            .execute()
+        )
+        return len(result.data)
+    else:
+        seen = {p["provider_id"] for p in _memory_payments}
+        written = 0
+        for p in payments:
+            if p["menu_slug"] not in _memory_store or p["provider_id"] in seen:
+                continue
+            seen.add(p["provider_id"])
+            _memory_payments.append({
+                "menu_id": p["menu_slug"],
+                "amount": p["amount"],
+                "status": "completed",
+                "provider_id": p["provider_id"],
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            })
+            written += 1
+        return written
 
 
 def list_menus(limit: int = 50) -> list[dict]:
@@ -4,20 +4,23 @@ import json
 import io
 import re
 import base64
+import asyncio
+import hashlib
 from pathlib import Path
 from typing import Optional
 
-import qrcode
-import stripe
+from startup import lazy_import, mark, start_prewarm, timings
 from fastapi import FastAPI, Form, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 from jinja2 import Environment, FileSystemLoader
-from openai import OpenAI
 import os
 
+# qrcode, stripe, openai and weasyprint are imported on first use (or by the
+# background prewarm after startup) — see get_openai_client / get_stripe
+
 load_dotenv(dotenv_path=Path(__file__).parent / ".env", override=True)
 
 app = FastAPI(title="MenuAI", version="0.1.0")
@@ -25,10 +28,29 @@ app = FastAPI(title="MenuAI", version="0.1.0")
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "")
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
 STRIPE_PRICE_ID = os.getenv("STRIPE_PRICE_ID", "")
 
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10 MB
+
+# ─── Admission control ────────────────────────────────────
+# Added before CORS so CORS stays outermost and rejections still carry CORS headers
+from admission import AdmissionMiddleware, EndpointClass
+
+AI_ADMISSION = EndpointClass.from_env("ai", rate_per_min=6, burst=3, max_concurrent=4)
+PDF_ADMISSION = EndpointClass.from_env("pdf", rate_per_min=10, burst=5, max_concurrent=2)
+
+app.add_middleware(
+    AdmissionMiddleware,
+    routes={
+        "/api/parse": (AI_ADMISSION, 256 * 1024),
+        "/api/parse-photo": (AI_ADMISSION, MAX_UPLOAD_SIZE + 64 * 1024),  # file + form fields
+        "/api/download-pdf": (PDF_ADMISSION, 1024 * 1024),
+    },
+    trust_proxy=os.getenv("TRUST_PROXY_HEADERS", "0") == "1",
+)
+
 # ─── CORS ─────────────────────────────────────────────────
 _cors_origins = ["http://localhost:5173", "http://localhost:3000"]
 if FRONTEND_URL and FRONTEND_URL not in _cors_origins:
@@ -45,7 +67,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+PREWARM = os.getenv("PREWARM", "1") == "1"
+
+_openai_client = None
+
+
+def get_openai_client():
+    """Return the OpenAI client, importing the SDK on first use."""
+    global _openai_client
+    if _openai_client is None:
+        openai = lazy_import("openai")
+        _openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _openai_client
+
+
+def _chat_completion(messages: list):
+    """
+    Blocking OpenAI call — run it with asyncio.to_thread. The SDK import and
+    client creation happen in here too, so a cold (or mid-prewarm) import
+    blocks that thread rather than the event loop.
+    """
+    return get_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        max_tokens=2000,
+        messages=messages,
+    )
+
+
+def get_stripe():
+    """Return the configured stripe module, importing it on first use."""
+    stripe = lazy_import("stripe")
+    stripe.api_key = STRIPE_SECRET_KEY
+    return stripe
+
 
 TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
 jinja_env = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)))
@@ -84,6 +138,16 @@ class PublishRequest(BaseModel):
 class PublishResponse(BaseModel):
     slug: str
     url: str
+    edit_token: str
+
+class UpdateMenuRequest(BaseModel):
+    patch: list[dict]  # JSON Patch (RFC 6902) against menu_data
+
+class UpdateMenuResponse(BaseModel):
+    slug: str
+    url: str
+    updated_at: Optional[str] = None
+    changed: bool
 
 class CheckoutRequest(BaseModel):
     slug: str
@@ -91,7 +155,20 @@ class CheckoutRequest(BaseModel):
 
 # ─── Database ─────────────────────────────────────────────────
 
-from database import save_menu, get_menu_by_slug, list_menus, mark_menu_paid
+from database import save_menu, get_menu_by_slug, list_menus, update_menu, check_edit_token
+from menu_patch import apply_patch, PatchError
+from webhooks import webhook_processor, paid_checkout, EventInProgress
+
+
+# ─── Cache ────────────────────────────────────────────────────
+
+from cache import get_cache, menu_key, content_key
+from menu_compact import CompactMenu, pack
+
+PARSE_CACHE_TTL = 24 * 3600  # identical input → identical AI result, skip the API call
+# Bump when the cached value format changes — the SQLite cache outlives deploys
+# and is shared with old workers during a rolling restart
+PARSE_CACHE_VERSION = "v2"
 
 
 # ─── AI Menu Parsing ───────────────────────────────────────────
@@ -130,26 +207,30 @@ Tekst użytkownika:
 @app.post("/api/parse", response_model=MenuData)
 async def parse_menu_text(req: ParseRequest):
     """Parse raw text into structured menu data using OpenAI."""
+    cache_key = content_key(f"parse:{PARSE_CACHE_VERSION}", req.text, req.business_name or "", req.menu_type)
+    cached = get_cache().get(cache_key)
+    if isinstance(cached, CompactMenu):
+        return cached.to_dict()
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            max_tokens=2000,
-            messages=[{
-                "role": "user",
-                "content": PARSE_PROMPT.format(
-                    text=req.text,
-                    business_name=req.business_name or "Moja Firma",
-                    menu_type=req.menu_type,
-                )
-            }]
-        )
+        # Blocking SDK call — run it in a thread so public pages keep being served
+        response = await asyncio.to_thread(_chat_completion, [{
+            "role": "user",
+            "content": PARSE_PROMPT.format(
+                text=req.text,
+                business_name=req.business_name or "Moja Firma",
+                menu_type=req.menu_type,
+            )
+        }])
 
         raw = response.choices[0].message.content.strip()
         if raw.startswith("```"):
             raw = raw.split("\n", 1)[1].rsplit("```", 1)[0]
 
         data = json.loads(raw)
-        return MenuData(**data)
+        menu = MenuData(**data)
+        get_cache().set(cache_key, CompactMenu.from_model(menu), ttl=PARSE_CACHE_TTL)
+        return menu
 
     except json.JSONDecodeError as e:
         raise HTTPException(400, f"AI returned invalid JSON: {e}")
@@ -157,12 +238,29 @@ async def parse_menu_text(req: ParseRequest):
         raise HTTPException(500, f"Parse failed: {e}")
 
 
-MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10 MB
+UPLOAD_CHUNK = 3 * 64 * 1024  # multiple of 3, so per-chunk base64 concatenates cleanly
 
 HEIC_MIME_ALIASES = {"image/heic", "image/heif", "application/octet-stream"}
 ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"} | HEIC_MIME_ALIASES
 
 
+async def _read_upload_b64(file: UploadFile) -> tuple[str, str]:
+    """
+    Read the (disk-spooled) upload in chunks, stopping at MAX_UPLOAD_SIZE.
+    Returns (base64, sha256 hex) without holding the raw bytes in memory.
+    """
+    digest = hashlib.sha256()
+    parts = []
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK):
+        size += len(chunk)
+        if size > MAX_UPLOAD_SIZE:
+            raise HTTPException(413, "Plik jest za duży. Maksymalny rozmiar to 10MB.")
+        digest.update(chunk)
+        parts.append(base64.b64encode(chunk).decode())
+    return "".join(parts), digest.hexdigest()
+
+
 @app.post("/api/parse-photo", response_model=MenuData)
 async def parse_menu_photo(
     file: UploadFile = File(...),
@@ -170,45 +268,43 @@ async def parse_menu_photo(
     menu_type: str = Form("price_list"),
 ):
     """Extract menu items from a photo using OpenAI Vision."""
-    contents = await file.read()
-
-    if len(contents) > MAX_UPLOAD_SIZE:
-        raise HTTPException(413, "Plik jest za duży. Maksymalny rozmiar to 10MB.")
-
     media = file.content_type or "image/jpeg"
     if media in HEIC_MIME_ALIASES:
         media = "image/jpeg"
     if media not in {"image/jpeg", "image/png", "image/webp", "image/gif"}:
         raise HTTPException(400, f"Nieobsługiwany format obrazu: {media}")
 
-    b64 = base64.b64encode(contents).decode()
+    b64, digest = await _read_upload_b64(file)
+
+    cache_key = content_key(f"parse-photo:{PARSE_CACHE_VERSION}", digest, business_name, menu_type)
+    cached = get_cache().get(cache_key)
+    if isinstance(cached, CompactMenu):
+        return cached.to_dict()
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            max_tokens=2000,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "image_url", "image_url": {"url": f"data:{media};base64,{b64}"}},
-                    {
-                        "type": "text",
-                        "text": PARSE_PROMPT.format(
-                            text="[Zdjęcie menu/cennika — wyodrębnij wszystkie pozycje i ceny]",
-                            business_name=business_name,
-                            menu_type=menu_type,
-                        ),
-                    },
-                ],
-            }],
-        )
+        response = await asyncio.to_thread(_chat_completion, [{
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": f"data:{media};base64,{b64}"}},
+                {
+                    "type": "text",
+                    "text": PARSE_PROMPT.format(
+                        text="[Zdjęcie menu/cennika — wyodrębnij wszystkie pozycje i ceny]",
+                        business_name=business_name,
+                        menu_type=menu_type,
+                    ),
+                },
+            ],
+        }])
 
         raw = response.choices[0].message.content.strip()
         if raw.startswith("```"):
             raw = raw.split("\n", 1)[1].rsplit("```", 1)[0]
 
         data = json.loads(raw)
-        return MenuData(**data)
+        menu = MenuData(**data)
+        get_cache().set(cache_key, CompactMenu.from_model(menu), ttl=PARSE_CACHE_TTL)
+        return menu
 
     except json.JSONDecodeError as e:
         raise HTTPException(400, f"Nie udało się odczytać menu ze zdjęcia: {e}")
@@ -221,13 +317,15 @@ async def parse_menu_photo(
 @app.post("/api/preview", response_class=HTMLResponse)
 async def preview_menu(req: GenerateRequest):
     """Render menu as HTML using selected template."""
+    # Not cached: a Jinja render is cheap, and every wizard keystroke would
+    # otherwise push published pages and PDFs out of the shared cache
     template_name = f"{req.template}.html"
     try:
         template = jinja_env.get_template(template_name)
     except Exception:
         raise HTTPException(400, f"Template '{req.template}' not found")
 
-    html = template.render(menu=req.menu.model_dump())
+    html = template.render(menu=CompactMenu.from_model(req.menu))
     return HTMLResponse(content=html)
 
 
@@ -242,12 +340,56 @@ async def publish_menu(req: PublishRequest):
         raise HTTPException(500, f"Nie udało się opublikować menu: {e}")
 
     url = f"{BASE_URL}/menu/{result['slug']}"
-    return PublishResponse(slug=result["slug"], url=url)
+    return PublishResponse(slug=result["slug"], url=url, edit_token=result["edit_token"])
+
+
+@app.patch("/api/menu/{slug}", response_model=UpdateMenuResponse)
+async def update_published_menu(slug: str, req: UpdateMenuRequest, request: Request):
+    """
+    Apply a JSON Patch to a published menu (e.g. one price change).
+    The slug and QR code stay the same; requires the X-Edit-Token issued on publish.
+    """
+    entry = get_menu_by_slug(slug, fresh=True)
+    if not entry:
+        raise HTTPException(404, "Menu nie znalezione")
+    if not check_edit_token(entry, request.headers.get("x-edit-token", "")):
+        raise HTTPException(403, "Brak uprawnień do edycji tego menu")
+
+    try:
+        patched = apply_patch(entry["menu_data"], req.patch)
+        menu = MenuData.model_validate(patched)
+    except PatchError as e:
+        raise HTTPException(400, f"Nieprawidłowa zmiana: {e}")
+    except ValidationError as e:
+        raise HTTPException(422, f"Menu po zmianie jest nieprawidłowe: {e}")
+
+    url = f"{BASE_URL}/menu/{slug}"
+    menu_data = menu.model_dump()
+    if menu_data == entry["menu_data"]:
+        return UpdateMenuResponse(slug=slug, url=url, updated_at=entry.get("updated_at"), changed=False)
+
+    try:
+        entry = update_menu(slug, menu_data, expected_updated_at=entry.get("updated_at"))
+    except Exception as e:
+        raise HTTPException(500, f"Nie udało się zaktualizować menu: {e}")
+    if not entry:
+        raise HTTPException(409, "Menu zostało w międzyczasie zmienione. Odśwież i spróbuj ponownie.")
+
+    # update_menu bumped the menu's cache version; the next visitor renders the
+    # new page. PDFs are cached by content, so the old PDF simply stops being requested.
+    return UpdateMenuResponse(slug=slug, url=url, updated_at=entry.get("updated_at"), changed=True)
 
 
 @app.get("/menu/{slug}", response_class=HTMLResponse)
 async def view_published_menu(slug: str):
     """Serve a published menu as a public HTML page."""
+    # Key taken before the row is read, so if the menu is paid or edited in
+    # between, the page rendered from the old row is stored under the old version
+    cache_key = menu_key(slug, "html")
+    html = get_cache().get(cache_key)
+    if html is not None:
+        return HTMLResponse(content=html)
+
     entry = get_menu_by_slug(slug)
     if not entry:
         raise HTTPException(404, "Menu nie znalezione")
@@ -259,6 +401,7 @@ async def view_published_menu(slug: str):
         raise HTTPException(500, "Szablon niedostępny")
 
     html = template.render(menu=entry["menu_data"], is_paid=entry.get("is_paid", False))
+    get_cache().set(cache_key, html)
     return HTMLResponse(content=html)
 
 
@@ -274,22 +417,37 @@ async def my_menus():
 
 # ─── PDF Download ─────────────────────────────────────────────
 
+def _write_pdf(html: str) -> bytes:
+    """Blocking WeasyPrint render (import included) — run it with asyncio.to_thread."""
+    return lazy_import("weasyprint").HTML(string=html).write_pdf()
+
+
 @app.post("/api/download-pdf")
 async def download_pdf(req: GenerateRequest):
     """Generate PDF from menu template. Falls back to print-ready HTML if weasyprint unavailable."""
+    filename = re.sub(r"[^a-z0-9]+", "-", req.menu.business_name.lower()).strip("-")
+    menu = CompactMenu.from_model(req.menu)
+    cache_key = content_key("pdf", req.template, pack(menu))
+    pdf_bytes = get_cache().get(cache_key)
+    if pdf_bytes is not None:
+        return StreamingResponse(
+            io.BytesIO(pdf_bytes),
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="{filename}-menu.pdf"'},
+        )
+
     template_name = f"{req.template}.html"
     try:
         template = jinja_env.get_template(template_name)
     except Exception:
         raise HTTPException(400, f"Template '{req.template}' not found")
 
-    html = template.render(menu=req.menu.model_dump(), pdf_mode=True)
+    html = template.render(menu=menu, pdf_mode=True)
 
     # Try WeasyPrint first
     try:
-        from weasyprint import HTML as WeasyHTML
-        pdf_bytes = WeasyHTML(string=html).write_pdf()
-        filename = re.sub(r"[^a-z0-9]+", "-", req.menu.business_name.lower()).strip("-")
+        pdf_bytes = await asyncio.to_thread(_write_pdf, html)
+        get_cache().set(cache_key, pdf_bytes)
         return StreamingResponse(
             io.BytesIO(pdf_bytes),
             media_type="application/pdf",
@@ -297,7 +455,6 @@ async def download_pdf(req: GenerateRequest):
         )
     except Exception:
         # Fallback: return print-optimized HTML that the browser can print to PDF
-        filename = re.sub(r"[^a-z0-9]+", "-", req.menu.business_name.lower()).strip("-")
         return HTMLResponse(
             content=html,
             headers={"Content-Disposition": f'attachment; filename="{filename}-menu.html"'},
@@ -309,6 +466,7 @@ async def download_pdf(req: GenerateRequest):
 @app.get("/api/qr")
 async def generate_qr(url: str):
     """Generate QR code PNG for a given URL."""
+    qrcode = lazy_import("qrcode")
     qr = qrcode.QRCode(version=1, box_size=10, border=2)
     qr.add_data(url)
     qr.make(fit=True)
@@ -333,11 +491,11 @@ async def create_checkout(req: CheckoutRequest):
     if entry.get("is_paid"):
         return {"already_paid": True, "url": None}
 
-    if not stripe.api_key or "your-stripe" in stripe.api_key:
+    if not STRIPE_SECRET_KEY or "your-stripe" in STRIPE_SECRET_KEY:
         raise HTTPException(503, "Płatności nie są jeszcze skonfigurowane.")
 
     try:
-        session = stripe.checkout.Session.create(
+        session = get_stripe().checkout.Session.create(
             mode="payment",
             payment_method_types=["card", "p24"],
             line_items=[{
@@ -370,6 +528,7 @@ async def stripe_webhook(request: Request):
     sig_header = request.headers.get("stripe-signature", "")
 
     if STRIPE_WEBHOOK_SECRET and "your-webhook" not in STRIPE_WEBHOOK_SECRET:
+        stripe = get_stripe()
         try:
             event = stripe.Webhook.construct_event(payload, sig_header, STRIPE_WEBHOOK_SECRET)
         except stripe.SignatureVerificationError:
@@ -379,15 +538,32 @@ async def stripe_webhook(request: Request):
     else:
         event = json.loads(payload)
 
-    if event.get("type") == "checkout.session.completed":
-        session = event["data"]["object"]
-        slug = session.get("metadata", {}).get("menu_slug")
-        if slug:
-            mark_menu_paid(slug)
+    # Acknowledged only once the paid flag and payments row are committed
+    # (batched with concurrent deliveries); any failure makes Stripe retry
+    checkout = paid_checkout(event)
+    if checkout:
+        try:
+            await webhook_processor.submit(checkout)
+        except EventInProgress:
+            raise HTTPException(409, "Webhook event is already being processed")
+        except asyncio.TimeoutError:
+            raise HTTPException(503, "Webhook processing timed out")
+        except Exception as e:
+            raise HTTPException(500, f"Webhook processing failed: {e}")
 
     return JSONResponse({"received": True})
 
 
+@app.on_event("startup")
+async def start_webhook_processor():
+    webhook_processor.start()
+
+
+@app.on_event("shutdown")
+async def stop_webhook_processor():
+    await webhook_processor.stop()
+
+
 @app.get("/api/menu-status/{slug}")
 async def menu_status(slug: str):
     """Check payment status of a published menu."""
@@ -401,8 +577,51 @@ async def menu_status(slug: str):
     }
 
 
+# ─── Startup & Prewarm ────────────────────────────────────────
+
+PREWARM_MENU = MenuData(
+    business_name="MenuAI",
+    business_type="restaurant",
+    categories=[MenuCategory(name="Menu", items=[MenuItem(name="Espresso", price="9 zł")])],
+)
+
+
+def _warm_templates():
+    for path in sorted(TEMPLATES_DIR.glob("*.html")):
+        jinja_env.get_template(path.name)
+
+
+def _warm_pdf():
+    """Font discovery and CSS setup happen on the first write_pdf() call."""
+    html = jinja_env.get_template("clean.html").render(
+        menu=CompactMenu.from_model(PREWARM_MENU), pdf_mode=True,
+    )
+    _write_pdf(html)
+
+
+def _warm_qr():
+    qrcode = lazy_import("qrcode")
+    qrcode.make(BASE_URL).save(io.BytesIO(), format="PNG")
+
+
+@app.on_event("startup")
+async def start_prewarm_phase():
+    mark("startup")
+    if PREWARM:
+        start_prewarm({
+            "templates": _warm_templates,
+            "qr": _warm_qr,
+            "openai": get_openai_client,
+            "stripe": get_stripe,
+            "pdf": _warm_pdf,
+        })
+
+
 # ─── Health Check ─────────────────────────────────────────────
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok", "version": "0.1.0"}
\ No newline at end of file
+    return {"status": "ok", "version": "0.1.0", "startup_ms": timings()}
+
+
+mark("import")
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""Compact in-memory menu representation and fast (orjson) serialization.
+
+The public API keeps using the pydantic models in main.py; this is the
+internal form used for rendering and caching. Templates can render a
+CompactMenu directly — Jinja falls back to attribute access.
+"""
+
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:  # optional — plain json works, just slower
+    orjson = None
+
+
+# ─── JSON ────────────────────────────────────────────────────
+
+def dumps(value) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson if installed)."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes | str):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# ─── Compact model ───────────────────────────────────────────
+
+class CompactItem:
+    __slots__ = ("name", "description", "price")
+
+    def __init__(self, name: str, description: str | None, price: str):
+        self.name = name
+        self.description = description
+        self.price = price
+
+
+class CompactCategory:
+    __slots__ = ("name", "items")
+
+    def __init__(self, name: str, items: tuple[CompactItem, ...]):
+        self.name = sys.intern(name)  # category names repeat across locations
+        self.items = items
+
+
+class CompactMenu:
+    __slots__ = ("business_name", "business_type", "tagline", "categories")
+
+    def __init__(self, business_name: str, business_type: str, tagline: str | None,
+                 categories: tuple[CompactCategory, ...]):
+        self.business_name = business_name
+        self.business_type = sys.intern(business_type)
+        self.tagline = tagline
+        self.categories = categories
+
+    @classmethod
+    def from_model(cls, menu) -> "CompactMenu":
+        """Build from a validated MenuData without going through model_dump()."""
+        return cls(
+            menu.business_name,
+            menu.business_type,
+            menu.tagline,
+            tuple(
+                CompactCategory(c.name, tuple(CompactItem(i.name, i.description, i.price) for i in c.items))
+                for c in menu.categories
+            ),
+        )
+
+    def to_dict(self) -> dict:
+        """Same shape as MenuData.model_dump() — the JSON API contract."""
+        return {
+            "business_name": self.business_name,
+            "business_type": self.business_type,
+            "tagline": self.tagline,
+            "categories": [
+                {
+                    "name": c.name,
+                    "items": [
+                        {"name": i.name, "description": i.description, "price": i.price}
+                        for i in c.items
+                    ],
+                }
+                for c in self.categories
+            ],
+        }
+
+
+# ─── Packed form ─────────────────────────────────────────────
+
+PACK_VERSION = 2
+
+
+def pack(menu: CompactMenu) -> bytes:
+    """
+    Array-backed JSON with no repeated key names:
+    [version, business_name, business_type, tagline,
+     [[category, [[name, description, price], ...]], ...]]
+    """
+    return dumps([
+        PACK_VERSION,
+        menu.business_name,
+        menu.business_type,
+        menu.tagline,
+        [
+            [c.name, [[i.name, i.description, i.price] for i in c.items]]
+            for c in menu.categories
+        ],
+    ])
+
+
+def unpack(data: bytes) -> CompactMenu:
+    version, business_name, business_type, tagline, categories = loads(data)
+    if version != PACK_VERSION:
+        raise ValueError(f"Unsupported packed menu version: {version}")
+    return CompactMenu(
+        business_name,
+        business_type,
+        tagline,
+        tuple(
+            CompactCategory(name, tuple(CompactItem(*item) for item in items))
+            for name, items in categories
+        ),
+    )
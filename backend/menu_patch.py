@@ -0,0 +1,116 @@
+"""JSON Patch (RFC 6902) for stored menu_data — used by the menu update API."""
+
+import copy
+
+
+class PatchError(ValueError):
+    """Raised when a patch operation is malformed or does not apply."""
+
+
+def _parse_pointer(path: str) -> list[str]:
+    """'/categories/0/items/2/price' → ['categories', '0', 'items', '2', 'price']."""
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer: {path!r}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool = False) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    # isascii: str.isdigit() also accepts e.g. "²", which int() rejects
+    if not (token.isascii() and token.isdigit()) or (len(token) > 1 and token.startswith("0")):
+        raise PatchError(f"Invalid list index: {token!r}")
+    i = int(token)
+    if i > len(container) or (i == len(container) and not allow_end):
+        raise PatchError(f"List index out of range: {i}")
+    return i
+
+
+def _resolve(doc, tokens: list[str]):
+    """Walk to the value a pointer refers to."""
+    node = doc
+    for token in tokens:
+        if isinstance(node, dict):
+            if token not in node:
+                raise PatchError(f"Path not found: {token!r}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token)]
+        else:
+            raise PatchError(f"Cannot descend into {type(node).__name__}")
+    return node
+
+
+def _add(doc, tokens: list[str], value):
+    if not tokens:
+        return value
+    parent, key = _resolve(doc, tokens[:-1]), tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, key, allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to {type(parent).__name__}")
+    return doc
+
+
+def _remove(doc, tokens: list[str]):
+    if not tokens:
+        raise PatchError("Cannot remove the whole document")
+    parent, key = _resolve(doc, tokens[:-1]), tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise PatchError(f"Path not found: {key!r}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, key))
+    raise PatchError(f"Cannot remove from {type(parent).__name__}")
+
+
+def _value(op: dict):
+    if "value" not in op:
+        raise PatchError(f"Operation without value: {op}")
+    return copy.deepcopy(op["value"])
+
+
+def apply_patch(doc: dict, operations: list[dict]) -> dict:
+    """
+    Apply JSON Patch operations (add, remove, replace, move, copy, test).
+    Returns a new document; the input is left untouched. Atomic — any
+    failing operation raises PatchError and nothing is applied.
+    """
+    doc = copy.deepcopy(doc)
+    for op in operations:
+        kind, path = op.get("op"), op.get("path")
+        if not isinstance(path, str):
+            raise PatchError(f"Operation without path: {op}")
+        tokens = _parse_pointer(path)
+
+        if kind == "add":
+            doc = _add(doc, tokens, _value(op))
+        elif kind == "remove":
+            _remove(doc, tokens)
+        elif kind == "replace":
+            _resolve(doc, tokens)  # target must exist
+            if tokens:
+                _remove(doc, tokens)
+            doc = _add(doc, tokens, _value(op))
+        elif kind in ("move", "copy"):
+            if not isinstance(op.get("from"), str):
+                raise PatchError(f"Operation without from: {op}")
+            source = _parse_pointer(op["from"])
+            if kind == "move":
+                if tokens[:len(source)] == source and tokens != source:
+                    raise PatchError("Cannot move a value into itself")
+                value = _remove(doc, source)
+            else:
+                value = copy.deepcopy(_resolve(doc, source))
+            doc = _add(doc, tokens, value)
+        elif kind == "test":
+            if _resolve(doc, tokens) != _value(op):
+                raise PatchError(f"Test failed at {path!r}")
+        else:
+            raise PatchError(f"Unsupported operation: {kind!r}")
+    return doc
@@ -0,0 +1,6 @@
+-- MenuAI: idempotent Stripe webhook processing
+-- Run after 001_create_tables.sql (Dashboard → SQL Editor → New Query)
+
+-- One payments row per Stripe transaction, so replayed webhook
+-- deliveries can be inserted with ON CONFLICT DO NOTHING
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_provider_id ON payments (provider_id);
@@ -0,0 +1,6 @@
+-- MenuAI: in-place menu updates
+-- Run after 002_payments_provider_unique.sql (Dashboard → SQL Editor → New Query)
+
+-- SHA-256 of the edit token returned by /api/publish. Menus published
+-- before this migration have no token and cannot be edited.
+ALTER TABLE menus ADD COLUMN IF NOT EXISTS edit_token_hash text;
@@ -0,0 +1,70 @@
+"""Startup phase — lazy imports, background prewarm and timing report."""
+
+import importlib
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_T0 = time.perf_counter()  # first import of this module ≈ process start
+_timings: dict[str, float] = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def timed(name: str):
+    """Record how long a block took, in milliseconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def mark(name: str) -> None:
+    """Record milliseconds elapsed since process start."""
+    with _lock:
+        _timings[name] = round((time.perf_counter() - _T0) * 1000, 1)
+
+
+def timings() -> dict[str, float]:
+    with _lock:
+        return dict(_timings)
+
+
+def lazy_import(module: str):
+    """
+    Import a cold-path dependency on first use, recording the import time.
+    Always goes through import_module: a module being imported by another
+    thread (e.g. the prewarm) is already in sys.modules but only half
+    initialised, and import_module waits for it to finish.
+    """
+    if module in sys.modules:
+        return importlib.import_module(module)
+    with timed(f"import:{module}"):
+        return importlib.import_module(module)
+
+
+def start_prewarm(steps: dict[str, Callable[[], object]], delay: float = 1.0) -> threading.Thread:
+    """
+    Run warm-up steps in a daemon thread, after a short delay so uvicorn
+    can bind the port first. A failing step is logged and skipped.
+    """
+    def run():
+        time.sleep(delay)
+        for name, step in steps.items():
+            try:
+                with timed(f"warm:{name}"):
+                    step()
+            except Exception as e:
+                logger.warning("Prewarm step %s failed: %s", name, e)
+        mark("warm:done")
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
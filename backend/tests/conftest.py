@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Backend modules are imported flat (uvicorn main:app is run from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,151 @@
+"""Unit tests for the admission control middleware, driven with a stub ASGI app."""
+
+import asyncio
+import json
+
+import pytest
+
+from admission import AdmissionMiddleware, EndpointClass
+
+LIMIT = 1024
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+def stub_app(endpoint: EndpointClass, before_last_chunk=None, fail: bool = False, seen: list | None = None):
+    """Reads the whole body, then answers 200 (or raises if fail)."""
+    async def app(scope, receive, send):
+        if before_last_chunk:
+            before_last_chunk()
+        await read_body(receive)
+        if seen is not None:
+            seen.append(endpoint.in_flight)
+        if fail:
+            raise RuntimeError("handler failed")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+def request(app, chunks=(b"{}",), headers=(), client=("10.0.0.1", 5000), path="/api/parse", method="POST"):
+    """Run one request through app. Returns (status, headers, parsed JSON or raw body)."""
+    scope = {
+        "type": "http", "method": method, "path": path, "client": client,
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+    }
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, body = sent[0], b"".join(m.get("body", b"") for m in sent[1:])
+    response_headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    if response_headers.get("content-type") == "application/json":
+        body = json.loads(body)
+    return start["status"], response_headers, body
+
+
+@pytest.fixture
+def endpoint():
+    return EndpointClass("ai", rate_per_min=6, burst=2, max_concurrent=1)
+
+
+def middleware(endpoint, **kwargs):
+    app = kwargs.pop("app", None) or stub_app(endpoint)
+    return AdmissionMiddleware(app, {"/api/parse": (endpoint, LIMIT)}, **kwargs)
+
+
+def test_admits_and_releases_slot(endpoint):
+    seen = []
+    status, _, body = request(middleware(endpoint, app=stub_app(endpoint, seen=seen)))
+    assert (status, body) == (200, b"ok")
+    assert seen == [1]  # slot held while the handler runs
+    assert endpoint.in_flight == 0
+
+
+def test_other_routes_pass_through(endpoint):
+    endpoint.in_flight = endpoint.max_concurrent
+    app = middleware(endpoint)
+    assert request(app, path="/api/preview")[0] == 200
+    assert request(app, method="GET")[0] == 200
+
+
+def test_full_class_rejected_before_spending_token(endpoint):
+    endpoint.in_flight = endpoint.max_concurrent
+    status, headers, body = request(middleware(endpoint))
+    assert status == 503
+    assert headers["retry-after"] == "1"
+    assert "zajęty" in body["detail"]
+    assert "10.0.0.1" not in endpoint._buckets
+
+
+def test_token_refunded_when_slot_lost_after_upload(endpoint):
+    def fill():  # another request takes the last slot while this body uploads
+        endpoint.in_flight = endpoint.max_concurrent
+
+    status, _, _ = request(middleware(endpoint, app=stub_app(endpoint, before_last_chunk=fill)))
+    assert status == 503
+    tokens, _ = endpoint._buckets["10.0.0.1"]
+    assert tokens == pytest.approx(endpoint.burst)
+    assert endpoint.in_flight == endpoint.max_concurrent  # nothing released that wasn't taken
+
+
+def test_rate_limited_with_retry_after(endpoint):
+    app = middleware(endpoint)
+    assert [request(app)[0] for _ in range(endpoint.burst)] == [200, 200]
+    status, headers, body = request(app)
+    assert status == 429
+    assert headers["retry-after"] == "10"  # 6/min → one token per 10 s
+    assert "Zbyt wiele" in body["detail"]
+    # Other clients have their own bucket
+    assert request(app, client=("10.0.0.2", 5000))[0] == 200
+
+
+def test_content_length_over_limit(endpoint):
+    status, _, body = request(middleware(endpoint), headers=[("content-length", str(LIMIT + 1))])
+    assert status == 413
+    assert body["detail"].endswith("Maksymalny rozmiar to 1KB.")
+    assert "10.0.0.1" not in endpoint._buckets
+
+
+def test_streamed_body_over_limit(endpoint):
+    chunks = (b"x" * 600, b"x" * 600)  # no Content-Length, e.g. chunked upload
+    status, _, body = request(middleware(endpoint), chunks=chunks)
+    assert status == 413
+    assert "1KB" in body["detail"]
+    assert endpoint.in_flight == 0
+
+
+def test_in_flight_released_when_handler_raises(endpoint):
+    seen = []
+    app = middleware(endpoint, app=stub_app(endpoint, fail=True, seen=seen))
+    with pytest.raises(RuntimeError):
+        request(app)
+    assert seen == [1]
+    assert endpoint.in_flight == 0
+
+
+@pytest.mark.parametrize("trust_proxy, expected", [
+    (False, "10.0.0.1"),
+    (True, "203.0.113.7"),
+])
+def test_client_key_from_forwarded_header(endpoint, trust_proxy, expected):
+    app = middleware(endpoint, trust_proxy=trust_proxy)
+    # The first hop is whatever the client sent; the last one was added by the proxy
+    request(app, headers=[("x-forwarded-for", "1.2.3.4, 203.0.113.7")])
+    assert list(endpoint._buckets) == [expected]
@@ -0,0 +1,85 @@
+"""Unit tests for the compact menu form and its packed serialization."""
+
+from types import SimpleNamespace
+
+import pytest
+
+import menu_compact
+from menu_compact import CompactMenu, pack, unpack
+
+MENU = {
+    "business_name": "Salon Fryzjerski Ewa",
+    "business_type": "salon",
+    "tagline": "Piękne fryzury na każdą okazję",
+    "categories": [
+        {
+            "name": "Strzyżenie",
+            "items": [
+                {"name": "Strzyżenie damskie", "description": "Mycie, strzyżenie, modelowanie", "price": "80 zł"},
+                {"name": "Strzyżenie męskie", "description": None, "price": "50 zł"},
+            ],
+        },
+        {
+            "name": "Koloryzacja",
+            "items": [{"name": "Balayage", "description": "Naturalne refleksy", "price": "150–250 zł"}],
+        },
+        {"name": "Pusta", "items": []},
+    ],
+}
+
+
+def as_model(data: dict):
+    """Stand-in for MenuData — from_model only reads attributes."""
+    return SimpleNamespace(
+        business_name=data["business_name"],
+        business_type=data["business_type"],
+        tagline=data["tagline"],
+        categories=[
+            SimpleNamespace(name=c["name"], items=[SimpleNamespace(**i) for i in c["items"]])
+            for c in data["categories"]
+        ],
+    )
+
+
+@pytest.fixture(params=["orjson", "json"])
+def codec(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(menu_compact, "orjson", None)
+    return request.param
+
+
+def test_from_model_matches_api_shape():
+    assert CompactMenu.from_model(as_model(MENU)).to_dict() == MENU
+
+
+def test_pack_round_trip(codec):
+    menu = CompactMenu.from_model(as_model(MENU))
+    assert unpack(pack(menu)).to_dict() == MENU
+
+
+def test_pack_round_trip_without_tagline(codec):
+    data = {**MENU, "tagline": None, "categories": []}
+    assert unpack(pack(CompactMenu.from_model(as_model(data)))).to_dict() == data
+
+
+def test_pack_is_deterministic(codec):
+    a = pack(CompactMenu.from_model(as_model(MENU)))
+    b = pack(CompactMenu.from_model(as_model(MENU)))
+    assert a == b
+
+
+def test_pack_is_smaller_than_dict_json():
+    menu = CompactMenu.from_model(as_model(MENU))
+    assert len(pack(menu)) < len(menu_compact.dumps(MENU))
+
+
+def test_unpack_rejects_other_versions():
+    packed = menu_compact.dumps([menu_compact.PACK_VERSION + 1, "X", "salon", None, []])
+    with pytest.raises(ValueError):
+        unpack(packed)
+
+
+def test_category_names_are_interned():
+    a = CompactMenu.from_model(as_model(MENU))
+    b = unpack(pack(a))
+    assert a.categories[0].name is b.categories[0].name
@@ -0,0 +1,159 @@
+"""Unit tests for the JSON Patch implementation behind PATCH /api/menu/{slug}."""
+
+import pytest
+
+from menu_patch import PatchError, apply_patch
+
+
+@pytest.fixture
+def doc():
+    return {
+        "business_name": "Pizzeria Roma",
+        "tagline": None,
+        "categories": [
+            {
+                "name": "Pizza",
+                "items": [
+                    {"name": "Margherita", "price": "28 zł"},
+                    {"name": "Capricciosa", "price": "32 zł"},
+                ],
+            },
+        ],
+    }
+
+
+def items(doc):
+    return doc["categories"][0]["items"]
+
+
+# ─── add ─────────────────────────────────────────────────────
+
+def test_add_object_member(doc):
+    out = apply_patch(doc, [{"op": "add", "path": "/tagline", "value": "Z pieca"}])
+    assert out["tagline"] == "Z pieca"
+
+
+def test_add_inserts_into_list(doc):
+    out = apply_patch(doc, [{"op": "add", "path": "/categories/0/items/1", "value": {"name": "Hawajska"}}])
+    assert [i["name"] for i in items(out)] == ["Margherita", "Hawajska", "Capricciosa"]
+
+
+def test_add_appends_with_dash(doc):
+    out = apply_patch(doc, [{"op": "add", "path": "/categories/0/items/-", "value": {"name": "Calzone"}}])
+    assert items(out)[-1] == {"name": "Calzone"}
+
+
+def test_add_requires_value(doc):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": "add", "path": "/tagline"}])
+
+
+def test_add_index_past_end(doc):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": "add", "path": "/categories/0/items/5", "value": {}}])
+
+
+# ─── remove ──────────────────────────────────────────────────
+
+def test_remove_list_item(doc):
+    out = apply_patch(doc, [{"op": "remove", "path": "/categories/0/items/0"}])
+    assert [i["name"] for i in items(out)] == ["Capricciosa"]
+
+
+def test_remove_missing_member(doc):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": "remove", "path": "/nope"}])
+
+
+def test_remove_root(doc):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": "remove", "path": ""}])
+
+
+# ─── replace ─────────────────────────────────────────────────
+
+def test_replace_price(doc):
+    out = apply_patch(doc, [{"op": "replace", "path": "/categories/0/items/1/price", "value": "34 zł"}])
+    assert items(out)[1]["price"] == "34 zł"
+
+
+def test_replace_root(doc):
+    out = apply_patch(doc, [{"op": "replace", "path": "", "value": {"business_name": "X"}}])
+    assert out == {"business_name": "X"}
+
+
+def test_replace_missing_target(doc):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": "replace", "path": "/categories/3/name", "value": "X"}])
+
+
+# ─── move / copy ─────────────────────────────────────────────
+
+def test_move_reorders(doc):
+    out = apply_patch(doc, [{"op": "move", "from": "/categories/0/items/1", "path": "/categories/0/items/0"}])
+    assert [i["name"] for i in items(out)] == ["Capricciosa", "Margherita"]
+
+
+def test_move_into_own_child(doc):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": "move", "from": "/categories/0", "path": "/categories/0/items/0"}])
+
+
+def test_copy(doc):
+    out = apply_patch(doc, [{"op": "copy", "from": "/categories/0/items/0", "path": "/categories/0/items/-"}])
+    assert items(out)[-1] == items(out)[0]
+    assert items(out)[-1] is not items(out)[0]
+
+
+@pytest.mark.parametrize("kind", ["move", "copy"])
+def test_move_copy_require_from(doc, kind):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": kind, "path": "/tagline"}])
+
+
+# ─── test ────────────────────────────────────────────────────
+
+def test_test_passes(doc):
+    ops = [
+        {"op": "test", "path": "/categories/0/items/0/price", "value": "28 zł"},
+        {"op": "replace", "path": "/categories/0/items/0/price", "value": "29 zł"},
+    ]
+    assert items(apply_patch(doc, ops))[0]["price"] == "29 zł"
+
+
+def test_test_fails(doc):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": "test", "path": "/business_name", "value": "Inna"}])
+
+
+# ─── general ─────────────────────────────────────────────────
+
+def test_escaped_pointer():
+    out = apply_patch({"a/b": 1, "c~d": 2}, [
+        {"op": "replace", "path": "/a~1b", "value": 3},
+        {"op": "remove", "path": "/c~0d"},
+    ])
+    assert out == {"a/b": 3}
+
+
+@pytest.mark.parametrize("op", [
+    {"op": "frobnicate", "path": "/tagline"},
+    {"op": "add", "value": 1},
+    {"op": "add", "path": "tagline", "value": 1},
+    {"op": "remove", "path": "/categories/01"},
+    {"op": "remove", "path": "/categories/²"},
+    {"op": "remove", "path": "/business_name/x"},
+])
+def test_malformed_operations(doc, op):
+    with pytest.raises(PatchError):
+        apply_patch(doc, [op])
+
+
+def test_failed_patch_leaves_input_untouched(doc):
+    before = {**doc, "categories": [dict(c, items=[dict(i) for i in c["items"]]) for c in doc["categories"]]}
+    with pytest.raises(PatchError):
+        apply_patch(doc, [
+            {"op": "replace", "path": "/categories/0/items/0/price", "value": "1 zł"},
+            {"op": "remove", "path": "/nope"},
+        ])
+    assert doc == before
@@ -0,0 +1,123 @@
+"""Unit tests for the batched Stripe webhook processor (database writes stubbed)."""
+
+import asyncio
+
+import pytest
+
+import webhooks
+from cache import MemoryCache
+from webhooks import EventInProgress, WebhookProcessor
+
+
+def checkout(n: int) -> dict:
+    return {"event_id": f"evt_{n}", "menu_slug": f"menu-{n}", "amount": 4900, "provider_id": f"pi_{n}"}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = MemoryCache()
+    monkeypatch.setattr(webhooks, "get_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Records every batch write; set db.fail to make the next menus update raise."""
+    class FakeDb:
+        def __init__(self):
+            self.fail = None
+            self.paid: list[list[str]] = []
+            self.payments: list[list[dict]] = []
+
+        def mark_menus_paid(self, slugs):
+            if self.fail:
+                error, self.fail = self.fail, None
+                raise error
+            self.paid.append(slugs)
+            return slugs
+
+        def record_payments(self, payments):
+            self.payments.append(payments)
+            return len(payments)
+
+    fake = FakeDb()
+    monkeypatch.setattr(webhooks, "mark_menus_paid", fake.mark_menus_paid)
+    monkeypatch.setattr(webhooks, "record_payments", fake.record_payments)
+    monkeypatch.setattr(webhooks, "WEBHOOK_BATCH_WINDOW", 0.05)
+    return fake
+
+
+def run(coro_fn):
+    """Run a test body with a fresh processor inside its own event loop."""
+    async def main():
+        processor = WebhookProcessor()
+        try:
+            return await coro_fn(processor)
+        finally:
+            await processor.stop()
+    return asyncio.run(main())
+
+
+def test_applies_and_marks_done(cache, db):
+    assert run(lambda p: p.submit(checkout(1))) is True
+    assert db.paid == [["menu-1"]]
+    assert db.payments == [[{"menu_slug": "menu-1", "amount": 4900, "provider_id": "pi_1"}]]
+    assert cache.get("stripe-event:evt_1") == "done"
+
+
+def test_done_event_returns_early(cache, db):
+    async def body(p):
+        assert await p.submit(checkout(1)) is True
+        return await p.submit(checkout(1))
+
+    assert run(body) is False
+    assert db.paid == [["menu-1"]]
+
+
+def test_failed_batch_releases_claim(cache, db):
+    db.fail = RuntimeError("supabase down")
+
+    async def body(p):
+        with pytest.raises(RuntimeError, match="supabase down"):
+            await p.submit(checkout(1))
+        assert cache.get("stripe-event:evt_1") is None
+        return await p.submit(checkout(1))  # Stripe's retry
+
+    assert run(body) is True
+    assert db.paid == [["menu-1"]]
+    assert cache.get("stripe-event:evt_1") == "done"
+
+
+def test_concurrent_duplicate_in_progress(cache, db):
+    async def body(p):
+        first = asyncio.create_task(p.submit(checkout(1)))
+        await asyncio.sleep(0)  # first delivery claims the event and waits for its batch
+        with pytest.raises(EventInProgress):
+            await p.submit(checkout(1))
+        return await first
+
+    assert run(body) is True
+    assert db.paid == [["menu-1"]]
+
+
+def test_deliveries_within_window_share_a_batch(cache, db):
+    async def body(p):
+        return await asyncio.gather(*(p.submit(checkout(n)) for n in range(3)))
+
+    assert run(body) == [True, True, True]
+    assert db.paid == [["menu-0", "menu-1", "menu-2"]]
+    assert len(db.payments) == 1 and len(db.payments[0]) == 3
+
+
+def test_stop_drains_queue(cache, db, monkeypatch):
+    monkeypatch.setattr(webhooks, "WEBHOOK_BATCH_WINDOW", 60)  # would outlive the test
+
+    async def body(p):
+        tasks = [asyncio.create_task(p.submit(checkout(n))) for n in range(2)]
+        await asyncio.sleep(0.01)  # both queued, worker still inside its batch window
+        await p.stop()
+        assert db.paid == [["menu-0", "menu-1"]]  # applied by stop(), not after the window
+        return await asyncio.gather(*tasks)
+
+    assert run(body) == [True, True]
+    assert cache.get("stripe-event:evt_0") == cache.get("stripe-event:evt_1") == "done"
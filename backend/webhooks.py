@@ -0,0 +1,164 @@
+"""Stripe webhook ingestion — dedupe on receipt, coalesce concurrent events into batched writes."""
+
+import asyncio
+import logging
+import os
+
+from cache import get_cache
+from database import mark_menus_paid, record_payments
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_BATCH_WINDOW = float(os.getenv("WEBHOOK_BATCH_WINDOW", "0.2"))  # seconds
+WEBHOOK_ACK_TIMEOUT = 10.0  # Stripe gives up on a delivery after ~20 s
+
+# Stripe retries failed deliveries for up to 3 days
+EVENT_DEDUPE_TTL = 3 * 24 * 3600
+# Claim held while an event is being applied; expires on its own if the process dies
+EVENT_PENDING_TTL = 120
+
+
+class EventInProgress(Exception):
+    """Another delivery of the same event is still being applied."""
+
+
+def paid_checkout(event) -> dict | None:
+    """
+    Reduce a checkout.session.completed event to what the worker needs.
+    Returns None for other event types or sessions without a menu slug.
+    """
+    if event.get("type") != "checkout.session.completed":
+        return None
+    session = event["data"]["object"]
+    slug = (session.get("metadata") or {}).get("menu_slug")
+    if not slug:
+        return None
+    return {
+        "event_id": event.get("id"),
+        "menu_slug": slug,
+        "amount": session.get("amount_total") or 0,
+        "provider_id": session.get("payment_intent") or session.get("id"),
+    }
+
+
+def _event_key(checkout: dict) -> str | None:
+    event_id = checkout.get("event_id")
+    return f"stripe-event:{event_id}" if event_id else None
+
+
+class WebhookProcessor:
+    """
+    Applies paid checkouts in batches without ever losing one.
+
+    submit() claims the event id in the shared cache as "pending", queues
+    the checkout and waits until its batch is committed. Only then is the
+    id marked "done" and the webhook acknowledged. If the batch fails, the
+    claim is released and the error surfaces as a non-2xx response, so
+    Stripe retries. Concurrent deliveries that arrive within
+    WEBHOOK_BATCH_WINDOW share one menus update and one payments insert,
+    written in a thread so page serving on the event loop is not blocked.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    async def submit(self, checkout: dict) -> bool:
+        """
+        Apply a paid checkout. Returns False if the event was already applied.
+        Raises EventInProgress, asyncio.TimeoutError or the batch's error.
+        """
+        key = _event_key(checkout)
+        if key and not get_cache().add(key, "pending", ttl=EVENT_PENDING_TTL):
+            if get_cache().get(key) == "done":
+                return False
+            raise EventInProgress(checkout["event_id"])
+
+        self.start()
+        done = asyncio.get_running_loop().create_future()
+        # A timed-out caller no longer awaits the result; don't log it as unretrieved
+        done.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._queue.put_nowait((checkout, done))
+        # On timeout the batch still completes (or releases the claim) in the background
+        await asyncio.wait_for(asyncio.shield(done), WEBHOOK_ACK_TIMEOUT)
+        return True
+
+    def start(self) -> None:
+        if self._task is None and not self._stopping:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Finish the in-flight batch and apply everything still queued."""
+        self._stopping = True
+        if self._task is not None:
+            self._queue.put_nowait(None)  # wakes a worker blocked on an empty queue
+            await self._task
+            self._task = None
+        while not self._queue.empty():
+            batch = [item for item in self._drain() if item is not None]
+            if batch:
+                await self._apply(batch)
+
+    def _drain(self) -> list:
+        batch = []
+        while not self._queue.empty() and len(batch) < WEBHOOK_BATCH_SIZE:
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + WEBHOOK_BATCH_WINDOW
+        while len(batch) < WEBHOOK_BATCH_SIZE and batch[-1] is not None:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            items = [item for item in batch if item is not None]
+            if items:
+                await self._apply(items)
+            if self._stopping and None in batch:
+                return
+
+    async def _apply(self, items: list) -> None:
+        checkouts = [checkout for checkout, _ in items]
+        try:
+            await asyncio.to_thread(apply_batch, checkouts)
+        except Exception as e:
+            logger.exception("Webhook batch failed: %s", e)
+            for checkout, done in items:
+                key = _event_key(checkout)
+                if key:
+                    get_cache().delete(key)  # let Stripe's retry through
+                if not done.done():
+                    done.set_exception(e)
+            return
+        for checkout, done in items:
+            key = _event_key(checkout)
+            if key:
+                get_cache().set(key, "done", ttl=EVENT_DEDUPE_TTL)
+            if not done.done():
+                done.set_result(True)
+
+
+def apply_batch(batch: list[dict]) -> None:
+    """Write one batch: a single paid-status update and a single payments insert."""
+    slugs = list(dict.fromkeys(c["menu_slug"] for c in batch))
+    mark_menus_paid(slugs)
+    record_payments([
+        {"menu_slug": c["menu_slug"], "amount": c["amount"], "provider_id": c["provider_id"]}
+        for c in batch
+        if c["provider_id"]
+    ])
+
+
+webhook_processor = WebhookProcessor()
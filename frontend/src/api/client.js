@@ -94,7 +94,27 @@ export async function publishMenu(menuData, template) {
     throw new Error("Błąd połączenia. Sprawdź czy serwer działa.");
   }
   if (!res.ok) throw new Error(`Błąd serwera: ${res.status}`);
-  return res.json(); // { slug, url }
+  return res.json(); // { slug, url, edit_token }
+}
+
+export async function updateMenu(slug, patch, editToken) {
+  let res;
+  try {
+    res = await fetch(`${API}/api/menu/${encodeURIComponent(slug)}`, {
+      method: "PATCH",
+      headers: { "Content-Type": "application/json", "X-Edit-Token": editToken },
+      body: JSON.stringify({ patch }),
+    });
+  } catch {
+    throw new Error("Błąd połączenia. Sprawdź czy serwer działa.");
+  }
+  if (!res.ok) {
+    const data = await res.json().catch(() => ({}));
+    const err = new Error(data.detail || `Błąd serwera: ${res.status}`);
+    err.status = res.status; // 403/404: token rejected or menu gone
+    throw err;
+  }
+  return res.json(); // { slug, url, updated_at, changed }
 }
 
 export async function getQrCode(url) {
@@ -18,6 +18,9 @@ export default function MenuWizard() {
   const [rawText, setRawText] = useState('')
   const [menuData, setMenuData] = useState(null)
   const [template, setTemplate] = useState('clean')
+  // { slug, editToken, template } once this menu is published — later
+  // publishes update that slug instead of creating a new one
+  const [published, setPublished] = useState(null)
 
   function goNext() {
     setCurrentStep((s) => Math.min(s + 1, 4))
@@ -34,6 +37,7 @@ export default function MenuWizard() {
 
   function handleContentDone(data) {
     setMenuData(data)
+    setPublished(null) // freshly parsed content is a new menu
     goNext()
   }
 
@@ -99,6 +103,8 @@ export default function MenuWizard() {
           template={template}
           setTemplate={setTemplate}
           onEditData={() => setCurrentStep(3)}
+          published={published}
+          onPublished={setPublished}
         />
       )}
 
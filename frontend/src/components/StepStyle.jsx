@@ -1,5 +1,5 @@
 import { useState, useEffect, useCallback } from 'react'
-import { getPreview, downloadPdf, publishMenu, getQrCode, createCheckout } from '../api/client'
+import { getPreview, downloadPdf, publishMenu, updateMenu, getQrCode, createCheckout } from '../api/client'
 import MenuPreview from './MenuPreview'
 
 const TEMPLATES = [
@@ -10,7 +10,11 @@ const TEMPLATES = [
   { id: 'pastel', label: 'Pastel', color: 'bg-pink-50 border-pink-300', icon: '🩷' },
 ]
 
-export default function StepStyle({ menuData, template, setTemplate, onEditData }) {
+// Raised when updating the already published menu fails for a reason other
+// than a rejected token or a deleted menu — shown as is, never republished
+class UpdateError extends Error {}
+
+export default function StepStyle({ menuData, template, setTemplate, onEditData, published, onPublished }) {
   const [previewHtml, setPreviewHtml] = useState('')
   const [loading, setLoading] = useState(false)
   const [downloading, setDownloading] = useState(false)
@@ -33,13 +37,13 @@ export default function StepStyle({ menuData, template, setTemplate, onEditData
       .finally(() => setLoading(false))
   }, [menuData, template])
 
-  // Reset published state when template changes
+  // Reset published state when template or data changes (next publish updates in place)
   useEffect(() => {
     setPublishedUrl(null)
     setPublishedSlug(null)
     setIsPaid(false)
     setQrBlobUrl(null)
-  }, [template])
+  }, [template, menuData])
 
   const showToast = useCallback((message) => {
     setToast(message)
@@ -50,7 +54,30 @@ export default function StepStyle({ menuData, template, setTemplate, onEditData
     if (publishedUrl && publishedSlug) {
       return { url: publishedUrl, slug: publishedSlug }
     }
+
+    // This menu was published before — update it in place so the slug
+    // (and printed QR codes) stay the same. The edit only replaces menu
+    // data, so a different template still needs a new publication.
+    if (published && published.template === template) {
+      try {
+        const result = await updateMenu(
+          published.slug,
+          [{ op: 'replace', path: '', value: menuData }],
+          published.editToken,
+        )
+        setPublishedUrl(result.url)
+        setPublishedSlug(result.slug)
+        return result
+      } catch (err) {
+        if (err.status !== 403 && err.status !== 404) {
+          throw new UpdateError(`Nie udało się zaktualizować menu: ${err.message}`)
+        }
+        // Token rejected or menu deleted — publish it again under a new slug
+      }
+    }
+
     const result = await publishMenu(menuData, template)
+    onPublished({ slug: result.slug, editToken: result.edit_token, template })
     setPublishedUrl(result.url)
     setPublishedSlug(result.slug)
     return result
@@ -86,7 +113,9 @@ export default function StepStyle({ menuData, template, setTemplate, onEditData
         window.location.href = result.url
       }
     } catch (err) {
-      if (err.message.includes('503') || err.message.includes('skonfigurowane')) {
+      if (err instanceof UpdateError) {
+        showToast(err.message)
+      } else if (err.message.includes('503') || err.message.includes('skonfigurowane')) {
         showToast('Płatności nie są jeszcze skonfigurowane. Użyj darmowego pobierania.')
       } else {
         showToast('Błąd płatności. Spróbuj ponownie.')
@@ -103,8 +132,8 @@ export default function StepStyle({ menuData, template, setTemplate, onEditData
       const qrBlob = await getQrCode(url)
       setQrBlobUrl(qrBlob)
       setShowQrModal(true)
-    } catch {
-      showToast('Błąd generowania kodu QR.')
+    } catch (err) {
+      showToast(err instanceof UpdateError ? err.message : 'Błąd generowania kodu QR.')
     } finally {
       setPublishing(false)
     }
@@ -115,8 +144,8 @@ export default function StepStyle({ menuData, template, setTemplate, onEditData
       const { url } = await ensurePublished()
       await navigator.clipboard.writeText(url)
       showToast('Menu opublikowane! Link skopiowany.')
-    } catch {
-      showToast('Nie udało się skopiować linku.')
+    } catch (err) {
+      showToast(err instanceof UpdateError ? err.message : 'Nie udało się skopiować linku.')
     }
   }
 